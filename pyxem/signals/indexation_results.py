@@ -19,18 +19,17 @@
 import hyperspy.api as hs
 from hyperspy.signal import BaseSignal
 from hyperspy.signals import Signal2D
+from functools import lru_cache
 from warnings import warn
 import numpy as np
-from operator import attrgetter
+from numba import njit, prange
 
 from pyxem.signals import transfer_navigation_axes
 from pyxem.signals.diffraction_vectors import generate_marker_inputs_from_peaks
-from pyxem.utils.indexation_utils import get_nth_best_solution
 
 from orix.quaternion import Rotation
 from orix.crystal_map import CrystalMap
 
-from transforms3d.euler import mat2euler
 
 def crystal_from_vector_matching(z_matches):
     """Takes vector matching results for a single navigation position and
@@ -46,65 +45,216 @@ def crystal_from_vector_matching(z_matches):
 
     Returns
     -------
-    results_array : numpy.array
-        Crystallographic mapping results in an array of shape (3) with entries
-        [phase, np.array((z, x, z)), dict(metrics)]
+    phase_index : int
+        Phase of the best match
+    rotation_matrix : numpy.array
+        Rotation matrix of the best match, shape (3, 3)
+    match_rate : float
+    total_error : float
+    phase_reliability : float
+        Reliability against the best match of any other phase, nan if there
+        are no matches of another phase
+    orientation_reliability : float
+        Reliability against the second best match of the same phase, nan if
+        there is no other match of the same phase
+    ehkls : numpy.array
+        Indexation error of each peak for the best match
     """
     if z_matches.shape == (1,):  # pragma: no cover
         z_matches = z_matches[0]
 
-    # Create empty array for results.
-    results_array = np.empty(3, dtype="object")
+    # pull out the sorting keys once rather than sorting the matches
+    total_errors = np.fromiter(
+        (match.total_error for match in z_matches), dtype=float, count=len(z_matches)
+    )
+    phase_indices = np.fromiter(
+        (match.phase_index for match in z_matches), dtype=int, count=len(z_matches)
+    )
 
     # get best matching phase
-    best_match = get_nth_best_solution(
-        z_matches, "vector", key="total_error", descending=False
+    best_match = z_matches[np.argmin(total_errors)]
+    best_error = best_match.total_error
+
+    same_phase = phase_indices == best_match.phase_index
+
+    # get second highest correlation phase for phase_reliability (if present)
+    phase_reliability = np.nan
+    if not np.all(same_phase):
+        phase_reliability = 100 * (1 - best_error / np.min(total_errors[~same_phase]))
+
+    # get second best matching orientation for orientation_reliability (if present)
+    orientation_reliability = np.nan
+    if np.count_nonzero(same_phase) > 1:
+        second_error = np.partition(total_errors[same_phase], 1)[1]
+        orientation_reliability = 100 * (1 - best_error / (second_error or 1.0))
+
+    return (
+        best_match.phase_index,
+        best_match.rotation_matrix,
+        best_match.match_rate,
+        best_error,
+        phase_reliability,
+        orientation_reliability,
+        best_match.error_hkls,
     )
-    results_array[0] = best_match.phase_index
 
-    # get best matching orientation Euler angles
-    results_array[1] = np.rad2deg(mat2euler(best_match.rotation_matrix, "rzxz"))
 
-    # get vector matching metrics
-    metrics = dict()
-    metrics["match_rate"] = best_match.match_rate
-    metrics["ehkls"] = best_match.error_hkls
-    metrics["total_error"] = best_match.total_error
+def _vector_match_arrays(matches):
+    """Gathers the vector matching results of every navigation position into
+    padded arrays, as used by _vector_match_reduce.
 
-    # get second highest correlation phase for phase_reliability (if present)
-    other_phase_matches = [
-        match for match in z_matches if match.phase_index != best_match.phase_index
-    ]
+    Parameters
+    ----------
+    matches : numpy.array
+        Object array with an array of OrientationResult at each navigation
+        position
 
-    if other_phase_matches:
-        second_best_phase = sorted(
-            other_phase_matches, key=attrgetter("total_error"), reverse=False
-        )[0]
+    Returns
+    -------
+    phase_indices : numpy.array
+        Phase index of each match in an array of shape (n, m), where n is the
+        number of navigation positions and m the largest number of matches at
+        a single position. Missing matches are padded with -1.
+    total_errors : numpy.array
+        Total error of each match in an array of shape (n, m), padded with inf
+    match_rates : numpy.array
+        Match rate of each match in an array of shape (n, m), padded with 0
+    rotation_matrices : numpy.array
+        Rotation matrix of each match in an array of shape (n, m, 3, 3), padded
+        with the identity
+    """
+    pixels = matches.ravel()
+    n_pixels = len(pixels)
+    n_matches = max([1] + [len(z_matches) for z_matches in pixels])
 
-        metrics["phase_reliability"] = 100 * (
-            1 - best_match.total_error / second_best_phase.total_error
-        )
+    phase_indices = np.full((n_pixels, n_matches), -1)
+    total_errors = np.full((n_pixels, n_matches), np.inf)
+    match_rates = np.zeros((n_pixels, n_matches))
+    rotation_matrices = np.tile(np.identity(3), (n_pixels, n_matches, 1, 1))
+
+    for i, z_matches in enumerate(pixels):
+        for j, match in enumerate(z_matches):
+            phase_indices[i, j] = match.phase_index
+            total_errors[i, j] = match.total_error
+            match_rates[i, j] = match.match_rate
+            rotation_matrices[i, j] = match.rotation_matrix
 
-        # get second best matching orientation for orientation_reliability
-        same_phase_matches = [
-            match for match in z_matches if match.phase_index == best_match.phase_index
-        ]
-        second_match = sorted(
-            same_phase_matches, key=attrgetter("total_error"), reverse=False
-        )[1]
+    return phase_indices, total_errors, match_rates, rotation_matrices
+
+
+@njit(cache=True)
+def _mat_to_quat(R, q):
+    """JIT-compiled conversion of a rotation matrix to the unit quaternion of
+    its inverse, which is the crystal2lab rotation, using Shoemake's method.
+
+    Parameters
+    ----------
+    R : numpy.array
+        Rotation matrix, shape (3, 3)
+    q : numpy.array
+        Array of shape (4,) to write the quaternion (a, b, c, d) into, with
+        a >= 0
+    """
+    k0 = 1 + R[0, 0] + R[1, 1] + R[2, 2]
+    k1 = 1 + R[0, 0] - R[1, 1] - R[2, 2]
+    k2 = 1 - R[0, 0] + R[1, 1] - R[2, 2]
+    k3 = 1 - R[0, 0] - R[1, 1] + R[2, 2]
+
+    # divide by the largest component to stay accurate near 180 degrees
+    if k0 >= k1 and k0 >= k2 and k0 >= k3:
+        s = 0.5 / np.sqrt(k0)
+        a, b, c, d = k0, R[2, 1] - R[1, 2], R[0, 2] - R[2, 0], R[1, 0] - R[0, 1]
+    elif k1 >= k2 and k1 >= k3:
+        s = 0.5 / np.sqrt(k1)
+        a, b, c, d = R[2, 1] - R[1, 2], k1, R[0, 1] + R[1, 0], R[0, 2] + R[2, 0]
+    elif k2 >= k3:
+        s = 0.5 / np.sqrt(k2)
+        a, b, c, d = R[0, 2] - R[2, 0], R[0, 1] + R[1, 0], k2, R[1, 2] + R[2, 1]
     else:
-        # get second best matching orientation for orientation_reliability
-        second_match = get_nth_best_solution(
-            z_matches, "vector", rank=1, key="total_error", descending=False
-        )
+        s = 0.5 / np.sqrt(k3)
+        a, b, c, d = R[1, 0] - R[0, 1], R[0, 2] + R[2, 0], R[1, 2] + R[2, 1], k3
 
-    metrics["orientation_reliability"] = 100 * (
-        1 - best_match.total_error / (second_match.total_error or 1.0)
-    )
+    # conjugate for the inverse rotation
+    if a < 0:
+        s = -s
+    q[0] = a * s
+    q[1] = -b * s
+    q[2] = -c * s
+    q[3] = -d * s
 
-    results_array[2] = metrics
 
-    return results_array
+@njit(cache=True, parallel=True)
+def _vector_match_reduce(phase_indices, total_errors, match_rates, rotation_matrices):
+    """JIT-compiled equivalent of crystal_from_vector_matching for all
+    navigation positions at once, giving quaternions rather than rotation
+    matrices and without the ehkls.
+
+    Parameters
+    ----------
+    phase_indices, total_errors, match_rates, rotation_matrices : numpy.array
+        Padded vector matching results, see _vector_match_arrays
+
+    Returns
+    -------
+    phase_id : numpy.array
+        Phase index of the best match at each navigation position, -1 where
+        there are no matches
+    quaternion : numpy.array
+        Unit quaternion of the crystal2lab rotation of the best match, the
+        inverse of its rotation matrix, shape (n, 4)
+    match_rate, total_error, phase_reliability, orientation_reliability : numpy.array
+        Metrics of the best match, nan where they are undefined
+    """
+    n_pixels, n_matches = total_errors.shape
+
+    phase_id = np.full(n_pixels, -1)
+    quaternion = np.empty((n_pixels, 4))
+    match_rate = np.full(n_pixels, np.nan)
+    total_error = np.full(n_pixels, np.nan)
+    phase_reliability = np.full(n_pixels, np.nan)
+    orientation_reliability = np.full(n_pixels, np.nan)
+
+    for i in prange(n_pixels):
+        # first match with the lowest error, as a stable sort would give
+        best = 0
+        for j in range(1, n_matches):
+            if total_errors[i, j] < total_errors[i, best]:
+                best = j
+        _mat_to_quat(rotation_matrices[i, best], quaternion[i])
+
+        best_phase = phase_indices[i, best]
+        if best_phase < 0:
+            continue
+        best_error = total_errors[i, best]
+
+        other_phase_error = np.inf
+        second_error = np.inf
+        for j in range(n_matches):
+            if j == best or phase_indices[i, j] < 0:
+                continue
+            if phase_indices[i, j] == best_phase:
+                second_error = min(second_error, total_errors[i, j])
+            else:
+                other_phase_error = min(other_phase_error, total_errors[i, j])
+
+        phase_id[i] = best_phase
+        match_rate[i] = match_rates[i, best]
+        total_error[i] = best_error
+        if other_phase_error < np.inf:
+            phase_reliability[i] = 100 * (1 - best_error / other_phase_error)
+        if second_error < np.inf:
+            orientation_reliability[i] = 100 * (
+                1 - best_error / (second_error if second_error != 0 else 1.0)
+            )
+
+    return (
+        phase_id,
+        quaternion,
+        match_rate,
+        total_error,
+        phase_reliability,
+        orientation_reliability,
+    )
 
 
 def get_phase_name_and_index(library):
@@ -125,16 +275,43 @@ def get_phase_name_and_index(library):
     return phase_name_index_dict
 
 
-def _peaks_from_best_template(single_match_result, library, rank=0):
+def _library_peaks_lookup(library):
+    """Returns a function giving the simulated peaks of a library entry,
+    caching each entry so it is only looked up in the library once.
+
+    Parameters
+    ----------
+    library : DiffractionLibrary
+        Diffraction library containing the phases and rotations.
+
+    Returns
+    -------
+    library_peaks : function
+        Takes a phase index and an orientation tuple and returns the
+        coordinates of the simulated peaks.
+    """
+    phase_names = list(library.keys())
+
+    @lru_cache(maxsize=None)
+    def library_peaks(phase_index, angle):
+        phase = phase_names[phase_index]
+        simulation = library.get_library_entry(phase=phase, angle=angle)["Sim"]
+        return simulation.coordinates[:, :2]  # cut z
+
+    return library_peaks
+
+
+def _peaks_from_best_template(single_match_result, library_peaks, rank=0):
     """Takes a TemplateMatchingResults object and return the associated peaks,
     to be used in combination with map().
 
     Parameters
     ----------
     single_match_result : ndarray
-        An entry in a TemplateMatchingResults.
-    library : DiffractionLibrary
-        Diffraction library containing the phases and rotations.
+        An entry in a TemplateMatchingResults, with shape (n_matches, 5) and
+        rows of phase, alpha, beta, gamma, score.
+    library_peaks : function
+        Lookup of simulated peaks, see _library_peaks_lookup.
     rank : int
         Get peaks from nth best orientation (default: 0, best vector match)
 
@@ -143,34 +320,71 @@ def _peaks_from_best_template(single_match_result, library, rank=0):
     peaks : array
         Coordinates of peaks in the matching results object in calibrated units.
     """
-    best_fit = get_nth_best_solution(single_match_result, "template", rank=rank)
+    # rank by score, ties keep the first match as _get_best_match does
+    ranking = np.argsort(-single_match_result[:, -1], kind="stable")
+    best_fit = single_match_result[ranking[rank]]
 
-    phase_names = list(library.keys())
-    phase_index = int(best_fit[0])
-    phase = phase_names[phase_index]
-    simulation = library.get_library_entry(phase=phase, angle=tuple(best_fit[1]))["Sim"]
+    return library_peaks(int(best_fit[0]), tuple(best_fit[1:4]))
+
+
+@njit(cache=True, parallel=True)
+def _best_match_cube(z, z_best):
+    """JIT-compiled selection of the highest scoring match at every
+    navigation pixel. As with np.nanargmax nan scores are ignored and the
+    first of tied scores is kept, a pixel with only nan scores keeps its
+    first match.
+
+    Parameters
+    ----------
+    z : np.array
+        array with shape (n_pixels, n_matches, 5), the 5 elements are phase, alpha, beta, gamma, score
+    z_best : np.array
+        array with shape (n_pixels, 5) to write the best matches into
+    """
+    n_pixels, n_matches, n_values = z.shape
+    for i in prange(n_pixels):
+        best = 0
+        for j in range(1, n_matches):
+            # a nan best score is replaced by the first score that is not nan
+            best_is_nan = z[i, best, -1] != z[i, best, -1]
+            is_nan = z[i, j, -1] != z[i, j, -1]
+            if z[i, j, -1] > z[i, best, -1] or (best_is_nan and not is_nan):
+                best = j
+        for k in range(n_values):
+            z_best[i, k] = z[i, best, k]
 
-    peaks = simulation.coordinates[:, :2]  # cut z
-    return peaks
 
 def _get_best_match(z):
-    """ Returns the match with the highest score for a given navigation pixel
+    """ Returns the match with the highest score for each navigation pixel
 
     Parameters
     ----------
     z : np.array
-        array with shape (5,n_matches), the 5 elements are phase, alpha, beta, gamma, score
+        array with shape (..., n_matches, 5), the 5 elements are phase, alpha, beta, gamma, score
 
     Returns
     -------
     z_best : np.array
-        array with shape (5,)
+        array with shape (..., 5)
     """
-    return z[:,np.argmax(z[-1,:])]
+    z_pixels = z.reshape((-1,) + z.shape[-2:])
+    z_best = np.empty((z_pixels.shape[0], z.shape[-1]), dtype=z.dtype)
+    _best_match_cube(z_pixels, z_best)
+    return z_best.reshape(z.shape[:-2] + z.shape[-1:])
+
 
 class GenericMatchingResults():
     def __init__(self,data):
-        self.data = hs.signals.Signal2D(data)
+        self.data = np.asarray(data)
+        self._signal = None
+
+    @property
+    def signal(self):
+        """hyperspy.signals.Signal2D : The matching results as a signal,
+        only created when it is first needed, e.g. for plotting or saving."""
+        if self._signal is None:
+            self._signal = hs.signals.Signal2D(self.data)
+        return self._signal
 
     def to_crystal_map(self):
         """
@@ -181,22 +395,23 @@ class GenericMatchingResults():
         -------
         orix.CrystalMap
         """
-        _s = self.data.map(_get_best_match,inplace=False)
+        best_match = _get_best_match(self.data)
 
         """ Gets properties """
-        phase_id = _s.isig[0].data.flatten()
-        alpha = _s.isig[1].data.flatten()
-        beta = _s.isig[2].data.flatten()
-        gamma = _s.isig[3].data.flatten()
-        score = _s.isig[4].data.flatten()
+        phase_id = best_match[..., 0].ravel()
+        alpha = best_match[..., 1].ravel()
+        beta = best_match[..., 2].ravel()
+        gamma = best_match[..., 3].ravel()
+        score = best_match[..., 4].ravel()
 
         """ Gets navigation placements """
-        xy = np.indices(_s.data.shape[:2])
-        x = xy[1].flatten()
-        y = xy[0].flatten()
+        height, width = best_match.shape[:2]
+        y, x = np.divmod(np.arange(height * width), width)
 
         """ Tidies up so we can put these things into CrystalMap """
-        euler = np.vstack((alpha,beta,gamma)).T
+        # one in-place conversion of the library's degrees to orix's radians
+        euler = np.stack((alpha, beta, gamma), axis=-1).astype(float, copy=False)
+        euler *= np.pi / 180
         rotations = Rotation.from_euler(euler,convention="bunge", direction="crystal2lab")
         properties = {"score":score}
 
@@ -218,7 +433,7 @@ class TemplateMatchingResults(GenericMatchingResults):
     --------
     Saving the signal containing all potential matches at each pixel
 
-    >>> TemplateMatchingResult.data.save("filename")
+    >>> TemplateMatchingResult.signal.save("filename")
 
     Exporting the best matches to a crystal map
 
@@ -244,7 +459,11 @@ class TemplateMatchingResults(GenericMatchingResults):
         **kwargs :
             Keyword arguments passed to signal.plot()
         """
-        match_peaks = self.map(_peaks_from_best_template, library=library, inplace=False)
+        match_peaks = self.signal.map(
+            _peaks_from_best_template,
+            library_peaks=_library_peaks_lookup(library),
+            inplace=False,
+        )
         mmx, mmy = generate_marker_inputs_from_peaks(match_peaks)
         signal.plot(*args, **kwargs)
         for mx, my in zip(mmx, mmy):
@@ -276,49 +495,36 @@ class VectorMatchingResults(BaseSignal):
         """Obtain a crystallographic map specifying the best matching phase and
         orientation at each probe position with corresponding metrics.
 
-        Raises
+        Returns
         -------
-        ValueError("Currently under development")
+        orix.CrystalMap
+            With the match_rate, total_error, phase_reliability and
+            orientation_reliability of the best match as properties
         """
-
-        raise ValueError("Currently under development")
-
-        _s = self.map(
-            crystal_from_vector_matching, inplace=False)
-
-        """ Gets phase, the easy bit """
-        phase_id = _s.isig[0].data.flatten()
+        # a single pass over the navigation positions to gather the matches
+        (
+            phase_id,
+            quaternions,
+            match_rate,
+            total_error,
+            phase_reliability,
+            orientation_reliability,
+        ) = _vector_match_reduce(*_vector_match_arrays(self.data))
 
         """ Deals with the properties, hard coded as of v0.13 """
-        # need to invert an array of dicts into a dict of arrays
-        def _map_to_get_property(prop):
-            return d[prop]
-
-        # assume same properties at every point of the signal
-        key_list = []
-        for key in _s.inav[0,0].isig[2]:
-            key_list.append(key)
-
-        properties = {}
-        for key in key_list:
-            _key_signal = _s.isig[2].map(_map_to_get_property,prop=key,inplace=False)
-            properties[key] = _key_signal
+        properties = {
+            "match_rate": match_rate,
+            "total_error": total_error,
+            "phase_reliability": phase_reliability,
+            "orientation_reliability": orientation_reliability,
+        }
 
         """ Deal with the rotations """
-        def _map_for_alpha_beta_gamma(ix):
-            return z[ix]
-
-        alpha = _s.isig[1].map(_map_for_alpha_beta_gamma,ix=0,inplace=False)
-        beta =  _s.isig[1].map(_map_for_alpha_beta_gamma,ix=1,inplace=False)
-        gamma = _s.isig[1].map(_map_for_alpha_beta_gamma,ix=2,inplace=False)
-
-        euler = np.vstack((alpha,beta,gamma)).T
-        rotations = Rotation.from_euler(euler,convention="bunge", direction="crystal2lab")
+        rotations = Rotation(quaternions)
 
         """ Gets navigation placements """
-        xy = np.indices(_s.data.shape[:2])
-        x = xy[1].flatten()
-        y = xy[0].flatten()
+        height, width = self.data.shape[:2]
+        y, x = np.divmod(np.arange(height * width), width)
 
         return CrystalMap(
                 rotations=rotations,
@@ -60,9 +60,9 @@ def test_TemplateIndexationGenerator(default_structure,method):
 
     z = indexer.correlate(method=method,n_largest=2)
     assert isinstance(z,TemplateMatchingResults)
-    assert isinstance(z.data,Signal2D)
-    assert z.data.data.shape[0:2] == edp.data.shape[0:2]
-    assert z.data.data.shape[3] == 5
+    assert isinstance(z.signal,Signal2D)
+    assert z.data.shape[0:2] == edp.data.shape[0:2]
+    assert z.data.shape[3] == 5
 
 
 @pytest.fixture
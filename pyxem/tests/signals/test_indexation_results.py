@@ -16,19 +16,186 @@
 # You should have received a copy of the GNU General Public License
 # along with pyXem.  If not, see <http://www.gnu.org/licenses/>.
 
+from types import SimpleNamespace
+
 import numpy as np
 import pytest
 
-from pyxem.signals.indexation_results import TemplateMatchingResults, VectorMatchingResults
+from pyxem.signals.indexation_results import (
+    TemplateMatchingResults,
+    VectorMatchingResults,
+    crystal_from_vector_matching,
+    _get_best_match,
+    _library_peaks_lookup,
+    _peaks_from_best_template,
+    _mat_to_quat,
+    _vector_match_arrays,
+    _vector_match_reduce,
+)
 from pyxem.signals.diffraction_vectors import DiffractionVectors
 from diffsims.libraries.vector_library import DiffractionVectorLibrary
 from pyxem.utils.indexation_utils import OrientationResult
 from transforms3d.euler import euler2mat
+from orix.quaternion import Rotation
 
 def test_TemplateMatchingResults_to_crystal_map():
     t = TemplateMatchingResults(np.empty((10,10,10,5)))
     return t.to_crystal_map()
 
+def test_TemplateMatchingResults_to_crystal_map_degrees():
+    data = np.zeros((1, 2, 2, 5))
+    data[0, 0] = [[0, 10, 20, 30, 0.5], [1, 90, 45, 30, 1.0]]
+    xmap = TemplateMatchingResults(data).to_crystal_map()
+    expected = Rotation.from_euler(
+        np.deg2rad([[90, 45, 30], [0, 0, 0]]),
+        convention="bunge",
+        direction="crystal2lab",
+    )
+    np.testing.assert_allclose(xmap.phase_id, [1, 0])
+    np.testing.assert_allclose(xmap.rotations.data, expected.data)
+
+def test_TemplateMatchingResults_to_crystal_map_integer():
+    xmap = TemplateMatchingResults(np.ones((2, 2, 3, 5), dtype=int)).to_crystal_map()
+    np.testing.assert_allclose(xmap.phase_id, [1] * 4)
+
+def test_get_best_match():
+    z = np.zeros((2, 3, 4, 5))
+    z[..., 0] = np.arange(4)
+    z[..., -1] = np.random.rand(2, 3, 4)
+    z[1, 2, 3, -1] = 2.0
+    best = _get_best_match(z)
+    assert best.shape == (2, 3, 5)
+    np.testing.assert_allclose(best[..., 0], np.argmax(z[..., -1], axis=-1))
+    assert best[1, 2, 0] == 3
+
+@pytest.mark.parametrize(
+    "scores, expected",
+    [
+        ([0.2, np.nan, 0.5], 2),
+        ([np.nan, 0.2, 0.5], 2),
+        ([0.5, np.nan, 0.5], 0),
+        ([np.nan, np.nan, np.nan], 0),
+    ],
+)
+def test_get_best_match_nan(scores, expected):
+    z = np.zeros((3, 5))
+    z[:, 0] = np.arange(3)
+    z[:, -1] = scores
+    assert _get_best_match(z)[0] == expected
+
+@pytest.mark.parametrize(
+    "phases, errors, phase, phase_reliability, orientation_reliability",
+    [
+        ([0, 0, 1, 1], [0.3, 0.4, 0.1, 0.2], 1, 100 * (1 - 0.1 / 0.3), 50.0),
+        ([0, 0, 0], [0.3, 0.2, 0.4], 0, None, 100 * (1 - 0.2 / 0.3)),
+        ([0, 1], [0.1, 0.2], 0, 50.0, None),
+    ],
+)
+def test_crystal_from_vector_matching(
+    phases, errors, phase, phase_reliability, orientation_reliability
+):
+    z_matches = np.empty(len(phases), dtype="object")
+    for i, (phase_index, total_error) in enumerate(zip(phases, errors)):
+        z_matches[i] = OrientationResult(
+            phase_index,
+            euler2mat(0, 0, i, "rzxz"),
+            0.5,
+            np.zeros((3, 3)),
+            total_error,
+            1.0,
+            0,
+            0,
+        )
+    best = z_matches[np.argmin(errors)]
+    result = crystal_from_vector_matching(z_matches)
+    assert result[0] == phase
+    np.testing.assert_allclose(result[1], best.rotation_matrix)
+    assert result[2] == best.match_rate
+    assert result[3] == best.total_error
+    if phase_reliability is None:
+        assert np.isnan(result[4])
+    else:
+        np.testing.assert_allclose(result[4], phase_reliability)
+    if orientation_reliability is None:
+        assert np.isnan(result[5])
+    else:
+        np.testing.assert_allclose(result[5], orientation_reliability)
+    np.testing.assert_allclose(result[6], best.error_hkls)
+
+class CountingLibrary(dict):
+    lookups = 0
+
+    def get_library_entry(self, phase, angle):
+        self.lookups += 1
+        coordinates = np.array([[*angle[:2], len(phase)]])
+        return {"Sim": SimpleNamespace(coordinates=coordinates)}
+
+def test_library_peaks_lookup():
+    library = CountingLibrary(a=None, bc=None)
+    library_peaks = _library_peaks_lookup(library)
+    for _ in range(3):
+        np.testing.assert_allclose(library_peaks(1, (0, 1, 2)), [[0, 1]])
+    np.testing.assert_allclose(library_peaks(0, (3, 4, 5)), [[3, 4]])
+    assert library.lookups == 2
+
+@pytest.mark.parametrize("rank, expected", [(0, [[40, 50]]), (1, [[10, 20]])])
+def test_peaks_from_best_template(rank, expected):
+    library = CountingLibrary(a=None, bc=None)
+    # rows of phase, alpha, beta, gamma, score
+    single_match_result = np.array(
+        [
+            [0, 10, 20, 30, 0.5],
+            [1, 40, 50, 60, 0.9],
+            [0, 70, 80, 90, 0.5],
+            [1, 15, 95, 25, 0.1],
+        ]
+    )
+    library_peaks = _library_peaks_lookup(library)
+    peaks = _peaks_from_best_template(single_match_result, library_peaks, rank=rank)
+    np.testing.assert_allclose(peaks, expected)
+    _peaks_from_best_template(single_match_result, library_peaks, rank=rank)
+    assert library.lookups == 1
+
+def test_vector_match_reduce():
+    rng = np.random.default_rng(0)
+    matches = np.empty((2, 3), dtype="object")
+    for index in np.ndindex(matches.shape):
+        n_matches = rng.integers(2, 6)
+        matches[index] = np.empty(n_matches, dtype="object")
+        for i in range(n_matches):
+            matches[index][i] = OrientationResult(
+                rng.integers(2),
+                euler2mat(*rng.random(3), "rzxz"),
+                rng.random(),
+                np.zeros((3, 3)),
+                rng.random(),
+                1.0,
+                0,
+                0,
+            )
+    # the best phase has a single match, so no orientation_reliability
+    matches[1, 2] = matches[1, 2][:2]
+    matches[1, 2][0] = matches[1, 2][0]._replace(phase_index=0, total_error=0.1)
+    matches[1, 2][1] = matches[1, 2][1]._replace(phase_index=1, total_error=0.2)
+
+    reduced = _vector_match_reduce(*_vector_match_arrays(matches))
+    assert np.isnan(reduced[5][-1])
+    for i, z_matches in enumerate(matches.ravel()):
+        expected = list(crystal_from_vector_matching(z_matches)[:6])
+        expected[1] = Rotation.from_matrix(expected[1].T).data.reshape(4)
+        for reduced_value, expected_value in zip(reduced, expected):
+            np.testing.assert_allclose(reduced_value[i], expected_value)
+
+@pytest.mark.parametrize(
+    "euler",
+    [[0.3, 1.2, -2.1], [-2.0, 0.0, 0.5], [1.0, 2.0, 0.0], [0.0, np.pi / 2, np.pi]],
+)
+def test_mat_to_quat(euler):
+    q = np.empty(4)
+    _mat_to_quat(euler2mat(*euler, "rzxz"), q)
+    expected = Rotation.from_euler(euler, convention="bunge", direction="crystal2lab")
+    np.testing.assert_allclose(q, expected.data.reshape(4), atol=1e-12)
+
 @pytest.fixture
 def sp_vector_match_result():
     # We require (total_error of row_1 > correlation row_2)
@@ -53,13 +220,14 @@ def sp_vector_match_result():
         0,
         0,
     )
-    return VectorMatchingResults(res)
+    matches = np.empty((1, 1), dtype="object")
+    matches[0, 0] = res
+    return VectorMatchingResults(matches)
 
 @pytest.fixture
 def dp_vector_match_result():
     res = np.empty(4, dtype="object")
-    res = res.reshape(2,2)
-    res[0,0] = OrientationResult(
+    res[0] = OrientationResult(
         0,
         euler2mat(*np.deg2rad([90, 0, 0]), "rzxz"),
         0.6,
@@ -69,7 +237,7 @@ def dp_vector_match_result():
         0,
         0,
     )
-    res[0,1] = OrientationResult(
+    res[1] = OrientationResult(
         0,
         euler2mat(*np.deg2rad([0, 10, 20]), "rzxz"),
         0.5,
@@ -79,7 +247,7 @@ def dp_vector_match_result():
         0,
         0,
     )
-    res[1,0] = OrientationResult(
+    res[2] = OrientationResult(
         1,
         euler2mat(*np.deg2rad([0, 45, 45]), "rzxz"),
         0.8,
@@ -89,7 +257,7 @@ def dp_vector_match_result():
         0,
         0,
     )
-    res[1,1] = OrientationResult(
+    res[3] = OrientationResult(
         1,
         euler2mat(*np.deg2rad([0, 0, 90]), "rzxz"),
         0.7,
@@ -99,15 +267,26 @@ def dp_vector_match_result():
         0,
         0,
     )
-    return VectorMatchingResults(res)
+    matches = np.empty((2, 2), dtype="object")
+    for index in np.ndindex(matches.shape):
+        matches[index] = res
+    return VectorMatchingResults(matches)
 
-@pytest.mark.skip(reason="Under development")
 def test_single_vector_to_crystal_map(sp_vector_match_result):
-    _ = sp_vector_match_result.to_crystal_map()
+    xmap = sp_vector_match_result.to_crystal_map()
+    np.testing.assert_allclose(xmap.phase_id, [0])
+    np.testing.assert_allclose(xmap.prop["total_error"], [0.1])
+    assert np.all(np.isnan(xmap.prop["phase_reliability"]))
+    np.testing.assert_allclose(xmap.prop["orientation_reliability"], [50.0])
 
-@pytest.mark.skip(reason="Under development")
 def test_double_vector_to_crystal_map(dp_vector_match_result):
-    _ = dp_vector_match_result.to_crystal_map()
+    xmap = dp_vector_match_result.to_crystal_map()
+    np.testing.assert_allclose(xmap.phase_id, [1] * 4)
+    np.testing.assert_allclose(xmap.prop["match_rate"], [0.8] * 4)
+    np.testing.assert_allclose(
+        xmap.prop["phase_reliability"], [100 * (1 - 0.1 / 0.3)] * 4
+    )
+    np.testing.assert_allclose(xmap.prop["orientation_reliability"], [50.0] * 4)
 
 
 @pytest.mark.parametrize(
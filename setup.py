@@ -69,7 +69,7 @@ setup(
         "pyfai",
         "ipywidgets",
         "numba",
-        "orix >= 0.3"
+        "orix >= 0.5"  # first release exporting Rotation from orix.quaternion
     ],
     package_data={
         "": ["LICENSE", "readme.rst"],